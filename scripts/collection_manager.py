@@ -3,73 +3,103 @@
 Collection (folder) management for Zotero library.
 """
 import argparse
-import json
+import re
 import sys
+from collections import Counter, defaultdict
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from zotero_client import get_client
+from zotero_client import ResourceNotFound, get_client
 from config import EXPORTS_DIR
+from json_utils import dumps
+
+# Zotero object keys: 8 characters from digits 2-9 and uppercase letters except O
+_KEY_RE = re.compile(r"^[23456789ABCDEFGHIJKLMNPQRSTUVWXYZ]{8}$")
+
+
+def is_collection_key(ident: str) -> bool:
+    """Check whether ident looks like a Zotero collection key (it may still be a name)."""
+    return bool(_KEY_RE.match(ident))
+
+
+class CollectionTree:
+    """Collection hierarchy stored as parallel lists indexed by collection position.
+    
+    Children (and roots) are sorted by name once, when the tree is built.
+    """
+    
+    def __init__(self, collections: List[Dict[str, Any]]):
+        self.keys: List[str] = [coll["key"] for coll in collections]
+        self.names: List[str] = [coll["data"]["name"] for coll in collections]
+        self.parents: List[Optional[str]] = [coll["data"].get("parentCollection") for coll in collections]
+        self.counts: List[int] = [coll["meta"].get("numItems", 0) for coll in collections]
+        
+        key_to_idx = {key: idx for idx, key in enumerate(self.keys)}
+        self.children_idx: List[List[int]] = [[] for _ in collections]
+        self.roots_idx: List[int] = []
+        for idx, parent_key in enumerate(self.parents):
+            parent_idx = key_to_idx.get(parent_key) if parent_key else None
+            if parent_idx is None:
+                self.roots_idx.append(idx)
+            else:
+                self.children_idx[parent_idx].append(idx)
+        
+        sort_names = [name.lower() for name in self.names]
+        self.roots_idx.sort(key=sort_names.__getitem__)
+        for children in self.children_idx:
+            children.sort(key=sort_names.__getitem__)
+    
+    def walk(self) -> Iterator[Tuple[int, int]]:
+        """Yield (index, depth) for every collection in depth-first, name-sorted order."""
+        stack = [(idx, 0) for idx in reversed(self.roots_idx)]
+        while stack:
+            idx, depth = stack.pop()
+            yield idx, depth
+            stack.extend((child, depth + 1) for child in reversed(self.children_idx[idx]))
+    
+    def to_dicts(self, indices: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Convert (a subtree of) the tree to nested dicts."""
+        if indices is None:
+            indices = self.roots_idx
+        return [
+            {
+                "key": self.keys[idx],
+                "name": self.names[idx],
+                "parent": self.parents[idx],
+                "children": self.to_dicts(self.children_idx[idx]),
+                "item_count": self.counts[idx],
+            }
+            for idx in indices
+        ]
 
 
 class CollectionManager:
     def __init__(self):
         self.client = get_client()
-        self._collections_cache: Dict[str, Dict] = {}
     
-    def get_collection_tree(self) -> List[Dict[str, Any]]:
+    def get_collection_tree(self) -> CollectionTree:
         """Get hierarchical collection tree."""
-        collections = self.client.get_all_collections()
-        
-        # Build lookup dict
-        lookup = {}
-        for coll in collections:
-            key = coll["key"]
-            lookup[key] = {
-                "key": key,
-                "name": coll["data"]["name"],
-                "parent": coll["data"].get("parentCollection"),
-                "children": [],
-                "item_count": coll["meta"].get("numItems", 0),
-            }
-        
-        # Build tree
-        roots = []
-        for key, node in lookup.items():
-            parent_key = node["parent"]
-            if parent_key and parent_key in lookup:
-                lookup[parent_key]["children"].append(node)
-            else:
-                roots.append(node)
-        
-        return roots
+        return CollectionTree(self.client.get_all_collections())
     
-    def print_tree(self, nodes: List[Dict] = None, indent: int = 0):
+    def print_tree(self, tree: Optional[CollectionTree] = None):
         """Print collection tree to console."""
-        if nodes is None:
-            nodes = self.get_collection_tree()
+        if tree is None:
+            tree = self.get_collection_tree()
         
-        for node in sorted(nodes, key=lambda x: x["name"]):
-            prefix = "  " * indent + ("├── " if indent > 0 else "")
-            print(f"{prefix}{node['name']} ({node['item_count']} items) [{node['key']}]")
-            if node["children"]:
-                self.print_tree(node["children"], indent + 1)
+        for idx, depth in tree.walk():
+            prefix = "  " * depth + ("├── " if depth > 0 else "")
+            print(f"{prefix}{tree.names[idx]} ({tree.counts[idx]} items) [{tree.keys[idx]}]")
     
     def export_tree_markdown(self, output_path: Optional[Path] = None) -> str:
         """Export collection tree as Markdown."""
-        def _to_md(nodes: List[Dict], level: int = 0) -> List[str]:
-            lines = []
-            for node in sorted(nodes, key=lambda x: x["name"]):
-                indent = "  " * level
-                lines.append(f"{indent}- **{node['name']}** ({node['item_count']} items)")
-                if node["children"]:
-                    lines.extend(_to_md(node["children"], level + 1))
-            return lines
-        
         tree = self.get_collection_tree()
-        content = "# Zotero Collections\n\n" + "\n".join(_to_md(tree))
+        lines = [
+            f"{'  ' * depth}- **{tree.names[idx]}** ({tree.counts[idx]} items)"
+            for idx, depth in tree.walk()
+        ]
+        content = "# Zotero Collections\n\n" + "\n".join(lines)
         
         if output_path:
             output_path.write_text(content, encoding="utf-8")
@@ -77,12 +107,12 @@ class CollectionManager:
         
         return content
     
-    def export_tree_json(self, output_path: Optional[Path] = None) -> Dict:
+    def export_tree_json(self, output_path: Optional[Path] = None) -> List[Dict]:
         """Export collection tree as JSON."""
-        tree = self.get_collection_tree()
+        tree = self.get_collection_tree().to_dicts()
         
         if output_path:
-            output_path.write_text(json.dumps(tree, indent=2, ensure_ascii=False), encoding="utf-8")
+            output_path.write_bytes(dumps(tree))
             print(f"Exported to: {output_path}")
         
         return tree
@@ -104,12 +134,19 @@ class CollectionManager:
     
     def find_collection_by_name(self, name: str) -> Optional[Dict]:
         """Find a collection by name (case-insensitive)."""
-        collections = self.client.get_all_collections()
-        name_lower = name.lower()
-        for coll in collections:
-            if coll["data"]["name"].lower() == name_lower:
-                return coll
-        return None
+        return self.client.get_collection_by_name(name)
+    
+    def resolve_collection(self, ident: str) -> Optional[Dict]:
+        """Find a collection by key or by name (case-insensitive).
+        
+        Identifiers that look like a collection key are returned as a stub
+        (`{"key": ..., "data": {"name": key}}`) without fetching the collection list.
+        Such an identifier may still be a collection name: callers that get
+        ResourceNotFound for the stub's key should retry with find_collection_by_name().
+        """
+        if is_collection_key(ident):
+            return {"key": ident, "data": {"name": ident}}
+        return self.find_collection_by_name(ident)
     
     def create_collection(self, name: str, parent_name: Optional[str] = None) -> bool:
         """Create a new collection, optionally under a parent."""
@@ -129,14 +166,21 @@ class CollectionManager:
         return False
     
     def organize_by_year(self, source_collection: str) -> Dict[str, int]:
-        """Organize items in a collection by year into sub-collections."""
-        source = self.find_collection_by_name(source_collection)
+        """Organize items in a collection (name or key) by year into sub-collections."""
+        # Sub-collections are named after the source, so look up the full collection;
+        # the collection list is needed anyway to find existing sub-collections
+        source = None
+        if is_collection_key(source_collection):
+            source = self.client.get_collection_by_key(source_collection)
+        if not source:
+            source = self.find_collection_by_name(source_collection)
         if not source:
             print(f"Collection '{source_collection}' not found")
             return {}
+        source_name = source["data"]["name"]
         
         items = self.client.get_collection_items(source["key"])
-        year_counts = {}
+        items_by_year: Dict[str, List[Dict]] = defaultdict(list)
         
         for item in items:
             if item["data"].get("itemType") == "attachment":
@@ -144,23 +188,51 @@ class CollectionManager:
             
             date = item["data"].get("date", "")
             year = date[:4] if date and date[:4].isdigit() else "Unknown"
-            
-            # Create year sub-collection if needed
-            year_coll_name = f"{source_collection}-{year}"
-            year_coll = self.find_collection_by_name(year_coll_name)
-            if not year_coll:
-                self.client.create_collection(year_coll_name, source["key"])
-                year_coll = self.find_collection_by_name(year_coll_name)
-            
+            items_by_year[year].append(item)
+        
+        # Find existing year sub-collections, then create the missing ones in one batch
+        year_keys: Dict[str, str] = {}
+        missing_years = []
+        for year in items_by_year:
+            year_coll = self.find_collection_by_name(f"{source_name}-{year}")
             if year_coll:
-                self.client.add_item_to_collection(item["key"], year_coll["key"])
-                year_counts[year] = year_counts.get(year, 0) + 1
+                year_keys[year] = year_coll["key"]
+            else:
+                missing_years.append(year)
+        
+        if missing_years:
+            result = self.client.create_collections([
+                {"name": f"{source_name}-{year}", "parentCollection": source["key"]}
+                for year in missing_years
+            ])
+            for index, key in result.get("success", {}).items():
+                year_keys[missing_years[int(index)]] = key
+        
+        # Add items to their year collection in memory, then write them back in batches
+        to_update = []
+        year_counts: Counter = Counter()
+        for year, year_items in items_by_year.items():
+            year_key = year_keys.get(year)
+            if not year_key:
+                print(f"Failed to create collection: {source_name}-{year}")
+                continue
+            
+            for item in year_items:
+                item_collections = item["data"].setdefault("collections", [])
+                if year_key not in item_collections:
+                    item_collections.append(year_key)
+                    to_update.append(item)
+                year_counts[year] += 1
+        
+        if to_update and not self.client.update_items(to_update):
+            print("Failed to update items")
+            return {}
         
         print(f"Organized {sum(year_counts.values())} items by year:")
         for year, count in sorted(year_counts.items()):
             print(f"  {year}: {count} items")
         
-        return year_counts
+        return dict(year_counts)
 
 
 def main():
@@ -184,7 +256,7 @@ def main():
     
     # organize command
     org_parser = subparsers.add_parser("organize", help="Organize collection by year")
-    org_parser.add_argument("collection", help="Collection name")
+    org_parser.add_argument("collection", help="Collection name or key")
     
     # test command
     subparsers.add_parser("test", help="Test Zotero connection")
@@ -214,16 +286,23 @@ def main():
             manager.print_tree()
     
     elif args.command == "list":
-        coll = manager.find_collection_by_name(args.collection)
+        coll = manager.resolve_collection(args.collection)
         if not coll:
             print(f"Collection '{args.collection}' not found")
             return
-        items = manager.list_collection_items(coll["key"])
+        try:
+            items = manager.list_collection_items(coll["key"])
+        except ResourceNotFound:
+            # Not a key after all: retry as a name that merely looks like one
+            if not is_collection_key(args.collection):
+                raise
+            coll = manager.find_collection_by_name(args.collection)
+            if not coll:
+                print(f"Collection '{args.collection}' not found")
+                return
+            items = manager.list_collection_items(coll["key"])
         for item in items:
-            authors = ", ".join(
-                c.get("lastName", c.get("name", "")) 
-                for c in item["creators"][:2]
-            )
+            authors = ", ".join([c.get("lastName") or c.get("name", "") for c in item["creators"][:2]])
             if len(item["creators"]) > 2:
                 authors += " et al."
             print(f"[{item['year']}] {item['title'][:60]}... - {authors}")
@@ -12,6 +12,7 @@ load_dotenv(BASE_DIR / ".env")
 EXPORTS_DIR = BASE_DIR / "exports"
 NOTES_DIR = BASE_DIR / "notes"
 STYLES_DIR = BASE_DIR / "styles"
+CACHE_DIR = EXPORTS_DIR / ".cache"
 
 # Zotero API configuration
 ZOTERO_CONFIG = {
@@ -3,244 +3,377 @@
 Export Zotero library data to various formats.
 """
 import argparse
-import json
+import io
+import os
+import re
 import sys
+from collections import Counter, defaultdict
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, NamedTuple, Optional, Union
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from zotero_client import get_client
+from zotero_client import ResourceNotFound, get_client
 from config import EXPORTS_DIR
+from json_utils import dumps
+
+# Map Zotero item types to BibTeX entry types
+TYPE_MAP = {
+    "journalArticle": "article",
+    "conferencePaper": "inproceedings",
+    "book": "book",
+    "bookSection": "incollection",
+    "thesis": "phdthesis",
+    "report": "techreport",
+    "webpage": "misc",
+}
+
+# Record attributes copied verbatim into BibTeX fields, in output order
+_SIMPLE_FIELDS = (
+    ("doi", "doi"),
+    ("url", "url"),
+    ("volume", "volume"),
+    ("issue", "number"),
+    ("pages", "pages"),
+)
+
+# Item types that are never exported
+_SKIP_TYPES = frozenset(("attachment", "note"))
+
+# Characters dropped from generated citation keys (anything str.isalnum() rejects)
+_NON_ALNUM_RE = re.compile(r"[\W_]")
+
+# Buffer size for streamed export files
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _key_suffix(n: int) -> str:
+    """Letter suffix for the n-th duplicate of a citation key (1 -> "a", 26 -> "z", 27 -> "aa")."""
+    suffix = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        suffix = chr(ord("a") + rem) + suffix
+    return suffix
+
+
+def _write_chunks(path: Path, chunks: Iterable[Union[str, bytes]]):
+    """Write chunks to path as they are produced, through a 1 MiB buffer.
+    
+    str chunks are encoded as UTF-8; bytes chunks are written as-is. Chunks go to a
+    temporary file next to `path` that replaces it only once all chunks are written,
+    so a failure part-way through leaves any previous export intact.
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_path.open("wb", buffering=0) as raw, io.BufferedWriter(raw, buffer_size=WRITE_BUFFER_SIZE) as buf:
+            write = buf.write
+            for chunk in chunks:
+                write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _write_joined(path: Path, separator: str, parts: Iterable[str]) -> int:
+    """Write separator.join(parts) to path as the parts are produced; return the number of parts."""
+    count = 0
+    
+    def _chunks() -> Iterator[str]:
+        nonlocal count
+        for part in parts:
+            if count:
+                yield separator
+            yield part
+            count += 1
+    
+    _write_chunks(path, _chunks())
+    return count
+
+
+class Record(NamedTuple):
+    """An exportable Zotero item with the fields the exporters need, parsed once.
+    
+    Raw fields hold `data.get(...)` as returned by the API; `year` is the four-digit
+    year of `date`, or "" if the date does not start with one.
+    """
+    key: str
+    item_type: str
+    bib_type: str
+    title: Optional[str]
+    creators: List[Dict[str, str]]
+    date: Optional[str]
+    year: str
+    doi: Optional[str]
+    url: Optional[str]
+    volume: Optional[str]
+    issue: Optional[str]
+    pages: Optional[str]
+    journal: Optional[str]
+    booktitle: Optional[str]
+    abstract: Optional[str]
+    tags: List[str]
+    collections: List[str]
 
 
 class LibraryExporter:
     def __init__(self):
         self.client = get_client()
     
-    def export_bibtex(self, collection_key: Optional[str] = None, output_path: Optional[Path] = None) -> str:
-        """Export items as BibTeX format."""
+    def _iter_items(self, collection_key: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream items from a collection, or top-level items if no collection given."""
         if collection_key:
-            items = self.client.get_collection_items(collection_key, limit=500)
-        else:
-            items = self.client.get_top_items(limit=500)
-        
-        bibtex_entries = []
+            return self.client.iter_collection_items(collection_key)
+        return self.client.iter_top_items()
+    
+    def _normalize(self, items: Iterable[Dict[str, Any]]) -> Iterator[Record]:
+        """Convert exportable items (no attachments or notes) to records."""
         for item in items:
             data = item["data"]
-            item_type = data.get("itemType", "")
-            
-            if item_type in ["attachment", "note"]:
+            g = data.get
+            item_type = g("itemType", "")
+            if item_type in _SKIP_TYPES:
                 continue
             
-            entry = self._item_to_bibtex(data)
-            if entry:
-                bibtex_entries.append(entry)
+            date = g("date")
+            yield Record(
+                key=item["key"],
+                item_type=item_type,
+                bib_type=TYPE_MAP.get(item_type, "misc"),
+                title=g("title"),
+                creators=g("creators", []),
+                date=date,
+                year=date[:4] if date and date[:4].isdigit() else "",
+                doi=g("DOI"),
+                url=g("url"),
+                volume=g("volume"),
+                issue=g("issue"),
+                pages=g("pages"),
+                journal=g("publicationTitle"),
+                booktitle=g("conferenceName"),
+                abstract=g("abstractNote"),
+                tags=[t["tag"] for t in g("tags", [])],
+                collections=g("collections", []),
+            )
+    
+    def _records(self, collection_key: Optional[str] = None) -> Iterator[Record]:
+        """Stream records from a collection, or from top-level items if no collection given."""
+        return self._normalize(self._iter_items(collection_key))
+    
+    def export_bibtex(self, collection_key: Optional[str] = None, output_path: Optional[Path] = None) -> Optional[str]:
+        """Export items as BibTeX format.
         
-        content = "\n\n".join(bibtex_entries)
+        Entries are streamed to `output_path` if given, otherwise returned as one string.
+        """
+        # Citation keys already used in this export, for de-duplication
+        seen: Counter = Counter()
+        entries = self._iter_bibtex_entries(self._records(collection_key), seen)
         
-        if output_path:
-            output_path.write_text(content, encoding="utf-8")
-            print(f"Exported {len(bibtex_entries)} items to: {output_path}")
+        if not output_path:
+            return "\n\n".join(entries)
         
-        return content
+        count = _write_joined(output_path, "\n\n", entries)
+        print(f"Exported {count} items to: {output_path}")
+        return None
+    
+    def _iter_bibtex_entries(self, records: Iterable[Record], seen: Counter) -> Iterator[str]:
+        """Yield a BibTeX entry for each record that has any fields."""
+        for record in records:
+            entry = self._item_to_bibtex(record, seen)
+            if entry:
+                yield entry
     
-    def _item_to_bibtex(self, data: Dict[str, Any]) -> str:
-        """Convert a Zotero item to BibTeX entry."""
-        item_type = data.get("itemType", "")
+    def _item_to_bibtex(self, record: Record, seen: Counter) -> str:
+        """Convert a record to BibTeX entry.
         
-        # Map Zotero types to BibTeX types
-        type_map = {
-            "journalArticle": "article",
-            "conferencePaper": "inproceedings",
-            "book": "book",
-            "bookSection": "incollection",
-            "thesis": "phdthesis",
-            "report": "techreport",
-            "webpage": "misc",
-        }
-        bib_type = type_map.get(item_type, "misc")
+        `seen` counts the citation keys emitted so far; a repeated key gets a
+        letter suffix ("a", "b", ...) so every entry in the export stays unique.
+        """
+        title = record.title or ""
+        creators = record.creators
         
         # Generate citation key
-        creators = data.get("creators", [])
         first_author = ""
         if creators:
             first_author = creators[0].get("lastName", creators[0].get("name", "unknown"))
-        year = data.get("date", "")[:4] if data.get("date") else "nodate"
-        title_word = data.get("title", "").split()[0] if data.get("title") else "notitle"
-        cite_key = f"{first_author.lower()}{year}{title_word.lower()}"
-        cite_key = "".join(c for c in cite_key if c.isalnum())
+        title_word = title.split()[0] if title else "notitle"
+        cite_key = f"{first_author}{record.year or 'nodate'}{title_word}".lower()
+        cite_key = _NON_ALNUM_RE.sub("", cite_key)
         
         # Build entry
         fields = []
         
         # Authors
         if creators:
-            authors = " and ".join(
-                f"{c.get('lastName', '')}, {c.get('firstName', '')}" 
-                if c.get("lastName") else c.get("name", "")
+            authors = " and ".join([
+                f"{last_name}, {c.get('firstName', '')}" if (last_name := c.get("lastName")) else c.get("name", "")
                 for c in creators if c.get("creatorType") == "author"
-            )
+            ])
             if authors:
                 fields.append(f"  author = {{{authors}}}")
         
         # Title
-        if data.get("title"):
-            fields.append(f"  title = {{{data['title']}}}")
+        if title:
+            fields.append(f"  title = {{{title}}}")
         
         # Year
-        if year and year != "nodate":
-            fields.append(f"  year = {{{year}}}")
+        if record.year:
+            fields.append(f"  year = {{{record.year}}}")
         
         # Journal/Conference
-        if item_type == "journalArticle" and data.get("publicationTitle"):
-            fields.append(f"  journal = {{{data['publicationTitle']}}}")
-        elif item_type == "conferencePaper" and data.get("conferenceName"):
-            fields.append(f"  booktitle = {{{data['conferenceName']}}}")
-        
-        # DOI
-        if data.get("DOI"):
-            fields.append(f"  doi = {{{data['DOI']}}}")
-        
-        # URL
-        if data.get("url"):
-            fields.append(f"  url = {{{data['url']}}}")
-        
-        # Volume, Issue, Pages
-        if data.get("volume"):
-            fields.append(f"  volume = {{{data['volume']}}}")
-        if data.get("issue"):
-            fields.append(f"  number = {{{data['issue']}}}")
-        if data.get("pages"):
-            fields.append(f"  pages = {{{data['pages']}}}")
+        if record.item_type == "journalArticle" and record.journal:
+            fields.append(f"  journal = {{{record.journal}}}")
+        elif record.item_type == "conferencePaper" and record.booktitle:
+            fields.append(f"  booktitle = {{{record.booktitle}}}")
+        
+        # DOI, URL, Volume, Issue, Pages
+        for attr, bib_field in _SIMPLE_FIELDS:
+            value = getattr(record, attr)
+            if value:
+                fields.append(f"  {bib_field} = {{{value}}}")
         
         if not fields:
             return ""
         
-        return f"@{bib_type}{{{cite_key},\n" + ",\n".join(fields) + "\n}"
+        # De-duplicate the citation key, skipping suffixed keys that are already taken
+        n = seen[cite_key]
+        seen[cite_key] = n + 1
+        if n:
+            base_key = cite_key
+            cite_key = base_key + _key_suffix(n)
+            while cite_key in seen:
+                n += 1
+                cite_key = base_key + _key_suffix(n)
+            seen[base_key] = n + 1
+            seen[cite_key] = 1
+        
+        return "".join(("@", record.bib_type, "{", cite_key, ",\n", ",\n".join(fields), "\n}"))
     
-    def export_json(self, collection_key: Optional[str] = None, output_path: Optional[Path] = None) -> List[Dict]:
-        """Export items as JSON."""
-        if collection_key:
-            items = self.client.get_collection_items(collection_key, limit=500)
-        else:
-            items = self.client.get_top_items(limit=500)
+    def export_json(self, collection_key: Optional[str] = None, output_path: Optional[Path] = None) -> Optional[List[Dict]]:
+        """Export items as JSON.
         
-        export_data = []
-        for item in items:
-            data = item["data"]
-            if data.get("itemType") in ["attachment", "note"]:
-                continue
-            
-            export_data.append({
-                "key": item["key"],
-                "type": data.get("itemType"),
-                "title": data.get("title"),
-                "creators": data.get("creators", []),
-                "date": data.get("date"),
-                "DOI": data.get("DOI"),
-                "url": data.get("url"),
-                "abstract": data.get("abstractNote"),
-                "tags": [t["tag"] for t in data.get("tags", [])],
-                "collections": data.get("collections", []),
-            })
-        
-        if output_path:
-            output_path.write_text(
-                json.dumps(export_data, indent=2, ensure_ascii=False),
-                encoding="utf-8"
-            )
-            print(f"Exported {len(export_data)} items to: {output_path}")
+        Records are streamed to `output_path` as a JSON array if given, otherwise returned as a list.
+        """
+        records = self._iter_json_records(self._records(collection_key))
         
-        return export_data
-    
-    def export_markdown_list(self, collection_key: Optional[str] = None, output_path: Optional[Path] = None) -> str:
-        """Export items as Markdown reading list."""
-        if collection_key:
-            items = self.client.get_collection_items(collection_key, limit=500)
-        else:
-            items = self.client.get_top_items(limit=500)
+        if not output_path:
+            return list(records)
+        
+        # Indent each record so the file matches dumps(records)
+        count = 0
         
-        lines = [f"# Zotero Library Export\n", f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"]
+        def _chunks() -> Iterator[bytes]:
+            nonlocal count
+            yield b"["
+            for record in records:
+                yield b",\n  " if count else b"\n  "
+                yield dumps(record).replace(b"\n", b"\n  ")
+                count += 1
+            yield b"\n]" if count else b"]"
         
+        _write_chunks(output_path, _chunks())
+        print(f"Exported {count} items to: {output_path}")
+        return None
+    
+    def _iter_json_records(self, records: Iterable[Record]) -> Iterator[Dict[str, Any]]:
+        """Yield a JSON export record for each record."""
+        for record in records:
+            yield {
+                "key": record.key,
+                "type": record.item_type,
+                "title": record.title,
+                "creators": record.creators,
+                "date": record.date,
+                "DOI": record.doi,
+                "url": record.url,
+                "abstract": record.abstract,
+                "tags": record.tags,
+                "collections": record.collections,
+            }
+    
+    def export_markdown_list(self, collection_key: Optional[str] = None, output_path: Optional[Path] = None) -> Optional[str]:
+        """Export items as Markdown reading list.
+        
+        Lines are streamed to `output_path` if given, otherwise returned as one string.
+        """
         # Group by year
-        by_year: Dict[str, List] = {}
-        for item in items:
-            data = item["data"]
-            if data.get("itemType") in ["attachment", "note"]:
-                continue
-            
-            year = data.get("date", "")[:4] if data.get("date") else "Unknown"
-            if year not in by_year:
-                by_year[year] = []
-            by_year[year].append(data)
+        by_year: Dict[str, List[Record]] = defaultdict(list)
+        for record in self._records(collection_key):
+            by_year[record.year or "Unknown"].append(record)
+        
+        lines = self._iter_markdown_lines(by_year)
+        
+        if not output_path:
+            return "\n".join(lines)
+        
+        _write_joined(output_path, "\n", lines)
+        print(f"Exported {sum(len(v) for v in by_year.values())} items to: {output_path}")
+        return None
+    
+    def _iter_markdown_lines(self, by_year: Dict[str, List[Record]]) -> Iterator[str]:
+        """Yield the lines of the Markdown reading list, newest year first."""
+        yield "# Zotero Library Export\n"
+        yield f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
         
         for year in sorted(by_year.keys(), reverse=True):
-            lines.append(f"\n## {year}\n")
-            for data in by_year[year]:
-                creators = data.get("creators", [])
-                authors = ", ".join(
-                    c.get("lastName", c.get("name", ""))
-                    for c in creators[:3]
-                )
+            yield f"\n## {year}\n"
+            for record in by_year[year]:
+                creators = record.creators
+                authors = ", ".join([c.get("lastName") or c.get("name", "") for c in creators[:3]])
                 if len(creators) > 3:
                     authors += " et al."
                 
-                title = data.get("title", "Untitled")
-                doi = data.get("DOI", "")
+                title = record.title or "Untitled"
                 
-                if doi:
-                    lines.append(f"- **{title}** - {authors} [DOI](https://doi.org/{doi})")
+                if record.doi:
+                    yield f"- **{title}** - {authors} [DOI](https://doi.org/{record.doi})"
                 else:
-                    lines.append(f"- **{title}** - {authors}")
-        
-        content = "\n".join(lines)
-        
-        if output_path:
-            output_path.write_text(content, encoding="utf-8")
-            print(f"Exported {sum(len(v) for v in by_year.values())} items to: {output_path}")
-        
-        return content
+                    yield f"- **{title}** - {authors}"
 
 
 def main():
     parser = argparse.ArgumentParser(description="Zotero Library Exporter")
     parser.add_argument("format", choices=["bibtex", "json", "markdown"], help="Export format")
-    parser.add_argument("-c", "--collection", help="Collection name (exports all if not specified)")
+    parser.add_argument("-c", "--collection", help="Collection name or key (exports all if not specified)")
     parser.add_argument("-o", "--output", help="Output file path")
     
     args = parser.parse_args()
     
     exporter = LibraryExporter()
     
-    # Find collection key if specified
+    # Resolve collection key if specified
     collection_key = None
     if args.collection:
-        from collection_manager import CollectionManager
+        from collection_manager import CollectionManager, is_collection_key
         manager = CollectionManager()
-        coll = manager.find_collection_by_name(args.collection)
+        coll = manager.resolve_collection(args.collection)
         if coll:
             collection_key = coll["key"]
         else:
             print(f"Collection '{args.collection}' not found")
             return
     
-    # Determine output path
+    # Determine exporter and output path
     timestamp = datetime.now().strftime("%Y%m%d")
     suffix = f"-{args.collection}" if args.collection else ""
+    export, extension = {
+        "bibtex": (exporter.export_bibtex, "bib"),
+        "json": (exporter.export_json, "json"),
+        "markdown": (exporter.export_markdown_list, "md"),
+    }[args.format]
+    output = Path(args.output) if args.output else EXPORTS_DIR / f"library{suffix}-{timestamp}.{extension}"
     
-    if args.format == "bibtex":
-        output = Path(args.output) if args.output else EXPORTS_DIR / f"library{suffix}-{timestamp}.bib"
-        exporter.export_bibtex(collection_key, output)
-    
-    elif args.format == "json":
-        output = Path(args.output) if args.output else EXPORTS_DIR / f"library{suffix}-{timestamp}.json"
-        exporter.export_json(collection_key, output)
-    
-    elif args.format == "markdown":
-        output = Path(args.output) if args.output else EXPORTS_DIR / f"library{suffix}-{timestamp}.md"
-        exporter.export_markdown_list(collection_key, output)
+    try:
+        export(collection_key, output)
+    except ResourceNotFound:
+        # Not a key after all: retry as a name that merely looks like one
+        if not (args.collection and is_collection_key(args.collection)):
+            raise
+        coll = manager.find_collection_by_name(args.collection)
+        if not coll:
+            print(f"Collection '{args.collection}' not found")
+            return
+        export(coll["key"], output)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+"""
+On-disk cache of Zotero collections and collection items, keyed by library version.
+"""
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from config import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class VersionCache:
+    """Last fetched collections/items of one library and the library version they reflect.
+    
+    Versions live in `zotero_versions.json`; the data itself is pickled next to it.
+    A cache written for a different library is ignored.
+    """
+    
+    def __init__(self, library_id: str, cache_dir: Path = CACHE_DIR):
+        self.library_id = str(library_id)
+        self.cache_dir = cache_dir
+        self.versions_path = cache_dir / "zotero_versions.json"
+        self.collections_path = cache_dir / "collections.pkl"
+        self.items_dir = cache_dir / "items"
+        self.versions = self._load_versions()
+    
+    def _load_versions(self) -> Dict[str, Any]:
+        empty = {"library_id": self.library_id, "collections_version": 0, "items_version": {}}
+        try:
+            versions = json.loads(self.versions_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return empty
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable version cache: {e}")
+            return empty
+        if versions.get("library_id") != self.library_id:
+            return empty
+        return versions
+    
+    def _save_versions(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.versions_path.write_text(json.dumps(self.versions, indent=2), encoding="utf-8")
+    
+    def _load_pickle(self, path: Path) -> Optional[Any]:
+        try:
+            with path.open("rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache file {path}: {e}")
+            return None
+    
+    def _save_pickle(self, path: Path, data: Any):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    @property
+    def collections_version(self) -> int:
+        return self.versions["collections_version"]
+    
+    def load_collections(self) -> Optional[List[Dict[str, Any]]]:
+        """Get the cached collections, or None if there are none for this library."""
+        if not self.collections_version:
+            return None
+        return self._load_pickle(self.collections_path)
+    
+    def save_collections(self, collections: List[Dict[str, Any]], version: int):
+        self._save_pickle(self.collections_path, collections)
+        self.versions["collections_version"] = version
+        self._save_versions()
+    
+    def items_version(self, collection_key: str) -> int:
+        return self.versions["items_version"].get(collection_key, 0)
+    
+    def load_items(self, collection_key: str) -> Optional[List[Dict[str, Any]]]:
+        """Get the cached items of a collection, or None if it is not cached."""
+        if not self.items_version(collection_key):
+            return None
+        return self._load_pickle(self.items_dir / f"{collection_key}.pkl")
+    
+    def save_items(self, collection_key: str, items: List[Dict[str, Any]], version: int):
+        self._save_pickle(self.items_dir / f"{collection_key}.pkl", items)
+        self.versions["items_version"][collection_key] = version
+        self._save_versions()
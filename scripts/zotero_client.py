@@ -2,18 +2,87 @@
 Zotero API client wrapper.
 """
 import logging
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
 
 try:
-    from pyzotero import zotero
+    from pyzotero import zotero, zotero_errors
+    # Raised for 404 responses; renamed ResourceNotFoundError in newer pyzotero releases
+    ResourceNotFound = getattr(zotero_errors, "ResourceNotFoundError", None) or zotero_errors.ResourceNotFound
     PYZOTERO_AVAILABLE = True
 except ImportError:
     PYZOTERO_AVAILABLE = False
+    
+    class ResourceNotFound(Exception):
+        """Stand-in so callers can catch not-found errors without pyzotero installed."""
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
 
-from config import ZOTERO_CONFIG
+from config import CACHE_DIR, ZOTERO_CONFIG
+from version_cache import VersionCache
 
 logger = logging.getLogger(__name__)
 
+# The Zotero API accepts at most 50 objects per write request
+WRITE_BATCH_SIZE = 50
+
+# Number of pages of a paginated read fetched concurrently
+MAX_FETCH_WORKERS = 5
+
+# Pages requested ahead of the consumer; bounds memory held by finished, unread pages
+MAX_PAGES_IN_FLIGHT = 2 * MAX_FETCH_WORKERS
+
+# Keep-alive connections per host; covers the fetch workers plus the main thread
+HTTP_POOL_SIZE = 8
+
+
+class _SessionRequests:
+    """Stand-in for the `requests` module that sends every call through one session."""
+    
+    def __init__(self, session: "requests.Session"):
+        self.get = session.get
+        self.post = session.post
+        self.put = session.put
+        self.patch = session.patch
+        self.delete = session.delete
+        self.head = session.head
+        self.request = session.request
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(requests, name)
+
+
+def _share_http_session():
+    """Make requests-based pyzotero reuse connections across API calls.
+    
+    Older pyzotero releases call requests.get/post/... directly, opening a new
+    TCP+TLS connection per call. Route those calls through one pooled session that
+    also retries transient failures. Releases with their own HTTP client are left alone.
+    """
+    if not REQUESTS_AVAILABLE or getattr(zotero, "requests", None) is not requests:
+        return
+    
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    zotero.requests = _SessionRequests(session)
+
 
 class ZoteroClient:
     def __init__(self, config: Dict[str, Any] = None):
@@ -28,13 +97,154 @@ class ZoteroClient:
                 "Set ZOTERO_API_KEY and ZOTERO_LIBRARY_ID in .env file"
             )
         
-        self.zot = zotero.Zotero(
+        _share_http_session()
+        self._config = config
+        self.zot = self._make_zot()
+        # pyzotero keeps per-request state on the instance, so each page-fetch worker
+        # thread gets its own; the executor (and so those instances) lives as long as the client
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Backoff/Retry-After deadline (time.monotonic()) seen by any instance, honoured by all page fetches
+        self._backoff_until = 0.0
+        self._backoff_lock = threading.Lock()
+        self._cache = VersionCache(
             config["library_id"],
-            config["library_type"],
-            config["api_key"]
+            CACHE_DIR / f"{config['library_type']}-{config['library_id']}"
         )
+        # Collection list with key and case-insensitive name indexes, cached until a collection changes
+        self._collections: Optional[List[Dict[str, Any]]] = None
+        self._by_key: Optional[Dict[str, Dict[str, Any]]] = None
+        self._by_name_lower: Optional[Dict[str, Dict[str, Any]]] = None
         logger.info("Zotero client initialized")
     
+    def _make_zot(self) -> "zotero.Zotero":
+        """Create a pyzotero instance for the configured library."""
+        return zotero.Zotero(
+            self._config["library_id"],
+            self._config["library_type"],
+            self._config["api_key"]
+        )
+    
+    def _thread_zot(self) -> "zotero.Zotero":
+        """Get the pyzotero instance owned by the current worker thread."""
+        zot = getattr(self._local, "zot", None)
+        if zot is None:
+            zot = self._local.zot = self._make_zot()
+        return zot
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get the page-fetch thread pool, creating it on first use."""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=MAX_FETCH_WORKERS,
+                        thread_name_prefix="zotero-fetch"
+                    )
+        return self._executor
+    
+    def _note_backoff(self, zot: "zotero.Zotero"):
+        """Record a Backoff/Retry-After delay from the last response of `zot` for all instances."""
+        response = zot.request
+        if response is None:
+            return
+        delay = response.headers.get("Backoff") or response.headers.get("Retry-After")
+        if not delay:
+            return
+        try:
+            delay = float(delay)
+        except ValueError:
+            # Retry-After may also be an HTTP date; pyzotero only handles seconds either
+            return
+        with self._backoff_lock:
+            self._backoff_until = max(self._backoff_until, time.monotonic() + delay)
+        if zot is not self.zot:
+            # Let later calls on the main instance (e.g. writes) wait as well
+            self.zot._set_backoff(delay)
+    
+    def _wait_for_backoff(self):
+        """Sleep until any backoff requested by the API has expired."""
+        remaining = self._backoff_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+    
+    def _fetch_page(self, zot: "zotero.Zotero", method: str, *args, **kwargs) -> List[Dict[str, Any]]:
+        """Fetch one page on `zot`, honouring and recording API backoff requests."""
+        self._wait_for_backoff()
+        try:
+            return getattr(zot, method)(*args, **kwargs)
+        finally:
+            self._note_backoff(zot)
+    
+    def _iter_paged(self, method: str, *args, limit: int = 100, **kwargs) -> Iterator[Dict[str, Any]]:
+        """Yield all results of a paginated read, in order.
+        
+        The first page reports the total result count; the remaining pages are then
+        fetched in parallel on the client's worker threads, at most
+        MAX_PAGES_IN_FLIGHT ahead of the consumer.
+        """
+        first_page = self._fetch_page(self.zot, method, *args, start=0, limit=limit, **kwargs)
+        total = int(self.zot.request.headers.get("Total-Results", len(first_page)))
+        yield from first_page
+        if total <= limit:
+            return
+        
+        def _fetch(start: int) -> List[Dict[str, Any]]:
+            return self._fetch_page(self._thread_zot(), method, *args, start=start, limit=limit, **kwargs)
+        
+        executor = self._get_executor()
+        starts = iter(range(limit, total, limit))
+        futures = deque(executor.submit(_fetch, start) for start in islice(starts, MAX_PAGES_IN_FLIGHT))
+        try:
+            while futures:
+                page = futures.popleft().result()
+                # Refill the window before yielding so fetching overlaps with consumption
+                start = next(starts, None)
+                if start is not None:
+                    futures.append(executor.submit(_fetch, start))
+                yield from page
+        finally:
+            # Don't keep fetching pages nobody will read if iteration stops early
+            for future in futures:
+                future.cancel()
+    
+    def _last_version(self) -> int:
+        """Library version reported by the last response of the main pyzotero instance."""
+        return int(self.zot.request.headers.get("Last-Modified-Version", 0))
+    
+    def _merge_changes(
+        self,
+        cached: List[Dict[str, Any]],
+        changed: List[Dict[str, Any]],
+        removed_keys: Iterable[str],
+    ) -> List[Dict[str, Any]]:
+        """Apply changed and removed objects to a cached object list."""
+        by_key = {obj["key"]: obj for obj in cached}
+        for key in removed_keys:
+            by_key.pop(key, None)
+        for obj in changed:
+            by_key[obj["key"]] = obj
+        return list(by_key.values())
+    
+    def _fetch_collections(self) -> List[Dict[str, Any]]:
+        """Fetch all collections, reusing the cached list if the library is unchanged.
+        
+        Item counts (`meta.numItems`) change without bumping the collection's own
+        version, so on any library change the (small) collection list is refetched
+        in full rather than patched with deltas.
+        """
+        since = self._cache.collections_version
+        cached = self._cache.load_collections()
+        if cached is not None:
+            self.zot.collections(since=since, limit=1)
+            if self._last_version() == since:
+                return cached
+        
+        collections = self.zot.everything(self.zot.collections())
+        self._cache.save_collections(collections, self._last_version())
+        return collections
+    
     def test_connection(self) -> bool:
         """Test the Zotero API connection."""
         try:
@@ -46,34 +256,103 @@ class ZoteroClient:
             return False
     
     def get_all_collections(self) -> List[Dict[str, Any]]:
-        """Get all collections (folders) in the library."""
-        return self.zot.collections()
+        """Get all collections (folders) in the library, fetched once and cached."""
+        if self._collections is None:
+            self._collections = self._fetch_collections()
+            self._by_key = {coll["key"]: coll for coll in self._collections}
+            self._by_name_lower = {}
+            for coll in self._collections:
+                self._by_name_lower.setdefault(coll["data"]["name"].lower(), coll)
+        return self._collections
+    
+    def get_collection_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Find a collection by name (case-insensitive) in the cached collection list."""
+        self.get_all_collections()
+        return self._by_name_lower.get(name.lower())
+    
+    def get_collection_by_key(self, collection_key: str) -> Optional[Dict[str, Any]]:
+        """Find a collection by key in the cached collection list."""
+        self.get_all_collections()
+        return self._by_key.get(collection_key)
+    
+    def _invalidate_collections(self):
+        """Drop the cached collection list after a collection was changed."""
+        self._collections = None
+        self._by_key = None
+        self._by_name_lower = None
     
     def get_collection(self, collection_key: str) -> Dict[str, Any]:
         """Get a specific collection by key."""
         return self.zot.collection(collection_key)
     
     def get_collection_items(self, collection_key: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get all items in a collection."""
-        return self.zot.collection_items(collection_key, limit=limit)
+        """Get all items in a collection, fetching `limit` items per page.
+        
+        Items are cached on disk; later calls only download the changes since the cached version.
+        """
+        since = self._cache.items_version(collection_key)
+        cached = self._cache.load_items(collection_key)
+        if cached is None:
+            items = list(self.iter_collection_items(collection_key, limit=limit))
+            self._cache.save_items(collection_key, items, self._last_version())
+            return items
+        
+        changed = list(self._iter_paged("collection_items", collection_key, limit=limit, since=since))
+        version = self._last_version()
+        if version == since:
+            return cached
+        
+        # Items modified since the cached version but no longer in this collection
+        # (including items moved to the trash), or deleted
+        changed_keys = {item["key"] for item in changed}
+        removed = set(self.zot.item_versions(since=since, includeTrashed=1)) - changed_keys
+        removed.update(self.zot.deleted(since=since).get("items", []))
+        items = self._merge_changes(cached, changed, removed)
+        self._cache.save_items(collection_key, items, version)
+        return items
+    
+    def iter_collection_items(self, collection_key: str, limit: int = 100) -> Iterator[Dict[str, Any]]:
+        """Yield all items in a collection, page by page."""
+        return self._iter_paged("collection_items", collection_key, limit=limit)
     
     def get_all_items(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get all items in the library."""
-        return self.zot.items(limit=limit)
+        """Get all items in the library, fetching `limit` items per page."""
+        return list(self._iter_paged("items", limit=limit))
     
     def get_top_items(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get top-level items (no parent)."""
-        return self.zot.top(limit=limit)
+        """Get top-level items (no parent), fetching `limit` items per page."""
+        return list(self.iter_top_items(limit=limit))
+    
+    def iter_top_items(self, limit: int = 100) -> Iterator[Dict[str, Any]]:
+        """Yield top-level items (no parent), page by page."""
+        return self._iter_paged("top", limit=limit)
     
     def create_collection(self, name: str, parent_key: Optional[str] = None) -> Dict[str, Any]:
         """Create a new collection."""
         payload = [{"name": name}]
         if parent_key:
             payload[0]["parentCollection"] = parent_key
+        self._invalidate_collections()
         return self.zot.create_collections(payload)
     
+    def create_collections(self, payload: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create several collections, batching the writes.
+        
+        Returns the merged API response; indices in "success" refer to positions in `payload`.
+        """
+        self._invalidate_collections()
+        result: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(payload), WRITE_BATCH_SIZE):
+            response = self.zot.create_collections(payload[start:start + WRITE_BATCH_SIZE])
+            for status, entries in response.items():
+                merged = result.setdefault(status, {})
+                for index, value in entries.items():
+                    merged[str(start + int(index))] = value
+        return result
+    
     def delete_collection(self, collection_key: str) -> bool:
         """Delete a collection."""
+        self._invalidate_collections()
         try:
             self.zot.delete_collection(collection_key)
             return True
@@ -83,6 +362,7 @@ class ZoteroClient:
     
     def update_collection(self, collection_key: str, name: str) -> bool:
         """Rename a collection."""
+        self._invalidate_collections()
         try:
             coll = self.zot.collection(collection_key)
             coll["data"]["name"] = name
@@ -106,6 +386,16 @@ class ZoteroClient:
             logger.error(f"Failed to add item to collection: {e}")
             return False
     
+    def update_items(self, items: List[Dict[str, Any]]) -> bool:
+        """Write back several modified items, batching the writes."""
+        try:
+            for start in range(0, len(items), WRITE_BATCH_SIZE):
+                self.zot.update_items(items[start:start + WRITE_BATCH_SIZE])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to update items: {e}")
+            return False
+    
     def remove_item_from_collection(self, item_key: str, collection_key: str) -> bool:
         """Remove an item from a collection."""
         try:
@@ -125,11 +415,20 @@ class ZoteroClient:
         return self.zot.items(q=query, limit=limit)
 
 
-_client: Optional[ZoteroClient] = None
+_clients: Dict[Tuple[str, str], ZoteroClient] = {}
+_clients_lock = threading.Lock()
 
-def get_client() -> ZoteroClient:
-    """Get or create the Zotero client singleton."""
-    global _client
-    if _client is None:
-        _client = ZoteroClient()
-    return _client
+def get_client(config: Dict[str, Any] = None) -> ZoteroClient:
+    """Get or create the Zotero client for a library (the configured one by default).
+    
+    Thread-safe: concurrent callers share a single client per library.
+    """
+    config = config or ZOTERO_CONFIG
+    library = (config.get("library_type", ""), str(config.get("library_id", "")))
+    client = _clients.get(library)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(library)
+            if client is None:
+                client = _clients[library] = ZoteroClient(config)
+    return client